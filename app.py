@@ -1,14 +1,17 @@
 import os
+import asyncio
 from datetime import datetime
+from typing import List
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from models import TextAnalysisRequest, TextAnalysisResponse, SearchRequest, SearchResponse
-from llm_service import LLMService, MockLLMService
+from models import TextAnalysisRequest, BatchAnalysisRequest, TextAnalysisResponse, SearchRequest, SearchResponse
+from llm_service import LLMService, BatchingLLMService, MockLLMService
 from nlp_service import NLPService, MockNLPService
 from database import DatabaseService, MockDatabaseService
+from cache_service import CacheService
 
 # Use mock services if no API key is provided
 use_mock = not os.getenv("OPENAI_API_KEY")
@@ -17,15 +20,28 @@ if use_mock:
     nlp_service = MockNLPService()
     db_service = MockDatabaseService()
 else:
-    llm_service = LLMService()
+    llm_service = BatchingLLMService(LLMService())
     nlp_service = NLPService()
     db_service = DatabaseService()
 
+# Cache of analysis results keyed by normalized input text
+cache_service = CacheService()
+
+# Analyses currently running, so identical concurrent requests share one pipeline
+inflight: dict[str, asyncio.Future] = {}
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup"""
+    """
+    Load the tokenizer and initialize database on startup, and release
+    connections and workers on shutdown
+    """
+    await llm_service.load_encoding()
     await db_service.init_db()
     yield
+    await llm_service.close()
+    await db_service.close()
+    nlp_service.close()
 
 # Initialize services
 app = FastAPI(title="LLM Knowledge Extractor", version="1.0.0", lifespan=lifespan)
@@ -38,32 +54,58 @@ async def read_root(request: Request):
     """Serve the main web interface"""
     return templates.TemplateResponse("index.html", {"request": request})
 
+def combine_results(llm_result: dict, keywords: List[str]) -> dict:
+    """Combine LLM analysis and NLP keywords into one analysis result"""
+    return {
+        "summary": llm_result["summary"],
+        "title": llm_result["title"],
+        "topics": llm_result["topics"],
+        "sentiment": llm_result["sentiment"],
+        "keywords": keywords
+    }
+
+async def run_analysis(text: str) -> dict:
+    """Run the LLM and NLP pipeline for text and combine the results"""
+    # Get LLM analysis and NLP keywords concurrently
+    llm_result, keywords = await asyncio.gather(
+        llm_service.analyze_text(text),
+        nlp_service.extract_keywords(text)
+    )
+    
+    return combine_results(llm_result, keywords)
+
 @app.post("/analyze", response_model=TextAnalysisResponse)
 async def analyze_text(request: TextAnalysisRequest):
     """
     Analyze text using LLM and NLP to extract summary, topics, sentiment, and keywords
     """
     try:
-        # Get LLM analysis
-        llm_result = await llm_service.analyze_text(request.text)
-        
-        # Get NLP keywords
-        keywords = nlp_service.extract_keywords(request.text)
+        cache_key = cache_service.make_key(request.text)
+        analysis_result = await cache_service.get(cache_key)
+        cached = analysis_result is not None
         
-        # Combine results
-        analysis_result = {
-            "summary": llm_result["summary"],
-            "title": llm_result["title"],
-            "topics": llm_result["topics"],
-            "sentiment": llm_result["sentiment"],
-            "keywords": keywords
-        }
+        if not cached:
+            task = inflight.get(cache_key)
+            if task is not None:
+                # Shield so a disconnecting follower doesn't cancel the shared work
+                analysis_result = await asyncio.shield(task)
+            else:
+                task = asyncio.ensure_future(run_analysis(request.text))
+                inflight[cache_key] = task
+                try:
+                    analysis_result = await asyncio.shield(task)
+                finally:
+                    del inflight[cache_key]
         
         # Save to database
         await db_service.save_analysis(request.text, analysis_result)
         
+        # Cache only once the result has been stored, so a failure is never served again
+        if not cached:
+            await cache_service.set(cache_key, analysis_result)
+        
         # Return response
-        return TextAnalysisResponse(
+        return TextAnalysisResponse.model_construct(
             summary=analysis_result["summary"],
             title=analysis_result["title"],
             topics=analysis_result["topics"],
@@ -75,6 +117,51 @@ async def analyze_text(request: TextAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.post("/analyze_batch", response_model=List[TextAnalysisResponse])
+async def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyze several texts at once, with one batched LLM call, one NLP pass,
+    and one database transaction
+    """
+    try:
+        cache_keys = [cache_service.make_key(text) for text in request.texts]
+        analysis_results = [await cache_service.get(key) for key in cache_keys]
+        
+        # Only texts without a cached result go through the pipeline
+        misses = [i for i, result in enumerate(analysis_results) if result is None]
+        if misses:
+            texts = [request.texts[i] for i in misses]
+            llm_results, keywords = await asyncio.gather(
+                llm_service.analyze_batch(texts),
+                nlp_service.extract_keywords_batch(texts)
+            )
+            for i, llm_result, text_keywords in zip(misses, llm_results, keywords):
+                analysis_results[i] = combine_results(llm_result, text_keywords)
+        
+        # Save to database
+        await db_service.save_analyses(list(zip(request.texts, analysis_results)))
+        
+        # Cache new results only once they have been stored
+        for i in misses:
+            await cache_service.set(cache_keys[i], analysis_results[i])
+        
+        # Return responses
+        created_at = datetime.now()
+        return [
+            TextAnalysisResponse.model_construct(
+                summary=analysis_result["summary"],
+                title=analysis_result["title"],
+                topics=analysis_result["topics"],
+                sentiment=analysis_result["sentiment"],
+                keywords=analysis_result["keywords"],
+                created_at=created_at
+            )
+            for analysis_result in analysis_results
+        ]
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
+
 @app.post("/search", response_model=SearchResponse)
 async def search_analyses(request: SearchRequest):
     """
@@ -115,7 +202,8 @@ async def get_stats():
     Get database statistics
     """
     try:
-        return await db_service.get_stats()
+        stats = await db_service.get_stats()
+        return {**stats, "cache": cache_service.get_stats()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
@@ -127,7 +215,7 @@ async def health_check():
         "timestamp": datetime.now().isoformat(),
         "services": {
             "llm": "mock" if use_mock else "openai",
-            "nlp": "mock" if use_mock else "nltk",
+            "nlp": "mock" if use_mock else "spacy",
             "database": "mock" if use_mock else "sqlite"
         }
     }
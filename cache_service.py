@@ -0,0 +1,58 @@
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class CacheService:
+    """In-memory TTL + LRU cache for analysis results"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        """Build a cache key from normalized input text"""
+        return hashlib.sha256(text.strip().lower().encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Return a cached value, or None if missing or expired"""
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    async def set(self, key: str, value: Dict):
+        """Store a value, evicting the least recently used entries if full"""
+        async with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
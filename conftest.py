@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from llm_service import MockLLMService
+from nlp_service import MockNLPService
+from database import MockDatabaseService
+
+# Run test event loops on uvloop where it is installed (it has no Windows build)
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """One event loop shared by every async test and session fixture"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def mock_llm():
+    """Mock LLM service shared by the whole session"""
+    return MockLLMService()
+
+
+@pytest.fixture(scope="session")
+def mock_nlp():
+    """Mock NLP service shared by the whole session"""
+    return MockNLPService()
+
+
+@pytest.fixture(scope="session")
+async def mock_db():
+    """Mock database service shared by the whole session, initialized once"""
+    db = MockDatabaseService()
+    await db.init_db()
+    return db
+
+
+@pytest.fixture(scope="session")
+def app_module(mock_llm, mock_nlp, mock_db):
+    """
+    Import the app on first use rather than at collection time, since importing
+    it builds the services it selects from the environment, and point its
+    module-level services (which the routes read) at the session mocks
+    """
+    import app
+    
+    originals = (app.llm_service, app.nlp_service, app.db_service)
+    app.llm_service = mock_llm
+    app.nlp_service = mock_nlp
+    app.db_service = mock_db
+    yield app
+    app.llm_service, app.nlp_service, app.db_service = originals
+
+
+@pytest.fixture(scope="session")
+def fastapi_app(app_module):
+    """The FastAPI application, with mock services installed"""
+    return app_module.app
@@ -1,142 +1,319 @@
+import re
+import bisect
 import sqlite3
-import json
+import time
+import asyncio
+from collections import defaultdict
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Set, Tuple
 import aiosqlite
+import orjson
 from models import TextAnalysisResponse, SearchRequest
 
 
+_INSERT_ANALYSIS = """
+    INSERT INTO text_analyses 
+    (original_text, summary, title, topics, sentiment, keywords)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
 class DatabaseService:
+    # Seconds a computed get_stats result is reused
+    STATS_TTL = 5
+    # Most queued writes committed together; rows that queue up while a
+    # commit is in progress share the next one
+    FLUSH_BATCH = 64
+    
     def __init__(self, db_path: str = "text_analysis.db"):
         self.db_path = db_path
+        self.db: Optional[aiosqlite.Connection] = None
+        # (computed_at, write generation, stats); only valid while no write has
+        # been committed since, which the generation counter tracks
+        self._stats_cache: Optional[Tuple[float, int, Dict]] = None
+        self._write_generation = 0
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
     
     async def init_db(self):
-        """Initialize the database with required tables"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS text_analyses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    original_text TEXT NOT NULL,
-                    summary TEXT NOT NULL,
-                    title TEXT,
-                    topics TEXT NOT NULL,  -- JSON array
-                    sentiment TEXT NOT NULL,
-                    keywords TEXT NOT NULL,  -- JSON array
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            await db.commit()
+        """Open the shared connection and initialize the database with required tables"""
+        self.db = await aiosqlite.connect(self.db_path)
+        # WAL lets readers proceed alongside the writer; NORMAL sync is safe with WAL
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        
+        await self.db.execute("""
+            CREATE TABLE IF NOT EXISTS text_analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                original_text TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                title TEXT,
+                topics TEXT NOT NULL,  -- JSON array
+                sentiment TEXT NOT NULL,
+                keywords TEXT NOT NULL,  -- JSON array
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Indexes in ORDER BY created_at DESC order, so LIMIT queries stop early
+        # instead of sorting the whole table; the composite one also serves
+        # sentiment filters
+        await self.db.execute("CREATE INDEX IF NOT EXISTS idx_analyses_created ON text_analyses(created_at DESC)")
+        await self.db.execute("CREATE INDEX IF NOT EXISTS idx_analyses_sent_created ON text_analyses(sentiment, created_at DESC)")
+        
+        # Full-text index over the searchable columns, kept in sync by triggers
+        async with self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'text_analyses_fts'"
+        ) as cursor:
+            fts_exists = await cursor.fetchone() is not None
+        
+        await self.db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS text_analyses_fts USING fts5(
+                original_text, summary, topics, keywords,
+                content='text_analyses', content_rowid='id'
+            )
+        """)
+        await self.db.execute("""
+            CREATE TRIGGER IF NOT EXISTS text_analyses_ai AFTER INSERT ON text_analyses BEGIN
+                INSERT INTO text_analyses_fts (rowid, original_text, summary, topics, keywords)
+                VALUES (new.id, new.original_text, new.summary, new.topics, new.keywords);
+            END
+        """)
+        await self.db.execute("""
+            CREATE TRIGGER IF NOT EXISTS text_analyses_ad AFTER DELETE ON text_analyses BEGIN
+                INSERT INTO text_analyses_fts (text_analyses_fts, rowid, original_text, summary, topics, keywords)
+                VALUES ('delete', old.id, old.original_text, old.summary, old.topics, old.keywords);
+            END
+        """)
+        await self.db.execute("""
+            CREATE TRIGGER IF NOT EXISTS text_analyses_au AFTER UPDATE ON text_analyses BEGIN
+                INSERT INTO text_analyses_fts (text_analyses_fts, rowid, original_text, summary, topics, keywords)
+                VALUES ('delete', old.id, old.original_text, old.summary, old.topics, old.keywords);
+                INSERT INTO text_analyses_fts (rowid, original_text, summary, topics, keywords)
+                VALUES (new.id, new.original_text, new.summary, new.topics, new.keywords);
+            END
+        """)
+        
+        # Index rows saved before the full-text table existed
+        if not fts_exists:
+            await self.db.execute("INSERT INTO text_analyses_fts (text_analyses_fts) VALUES ('rebuild')")
+        
+        await self.db.commit()
+        
+        self._write_queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._flush_writes())
+    
+    async def close(self):
+        """Flush pending writes and close the shared connection"""
+        if self._writer is not None:
+            # None tells the writer to flush what it has and stop
+            if not self._writer.done():
+                self._write_queue.put_nowait(None)
+            await asyncio.wait([self._writer])
+            self._writer = None
+        
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
     
     async def save_analysis(self, original_text: str, analysis_result: Dict) -> int:
         """Save a text analysis result to the database"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                INSERT INTO text_analyses 
-                (original_text, summary, title, topics, sentiment, keywords)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
+        return (await self.save_analyses([(original_text, analysis_result)]))[0]
+    
+    async def save_analyses(self, items: List[Tuple[str, Dict]]) -> List[int]:
+        """Queue (original_text, analysis_result) pairs for the writer and wait until they are committed"""
+        if self._writer is None or self._writer.done():
+            raise RuntimeError("Database writer is not running")
+        
+        loop = asyncio.get_running_loop()
+        futures = []
+        for original_text, analysis_result in items:
+            row = (
                 original_text,
                 analysis_result["summary"],
                 analysis_result["title"],
-                json.dumps(analysis_result["topics"]),
+                orjson.dumps(analysis_result["topics"]).decode(),
                 analysis_result["sentiment"],
-                json.dumps(analysis_result["keywords"])
-            ))
-            await db.commit()
-            return cursor.lastrowid
+                orjson.dumps(analysis_result["keywords"]).decode()
+            )
+            future = loop.create_future()
+            self._write_queue.put_nowait((row, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+    
+    async def _flush_writes(self):
+        """Commit queued writes in groups until a None sentinel arrives"""
+        batch = []
+        try:
+            stopping = False
+            while not stopping:
+                item = await self._write_queue.get()
+                if item is None:
+                    break
+                
+                # Commit right away, together with anything already queued
+                # (usually rows that arrived during the previous commit)
+                batch = [item]
+                while len(batch) < self.FLUSH_BATCH and not self._write_queue.empty():
+                    item = self._write_queue.get_nowait()
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                
+                await self._write_rows(batch)
+        finally:
+            # Fail writes still in flight or queued so their callers don't wait forever
+            while not self._write_queue.empty():
+                item = self._write_queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Database writer stopped"))
+    
+    async def _write_rows(self, batch: List[Tuple[tuple, asyncio.Future]]):
+        """Insert a group of rows in one transaction and resolve their futures with the new ids"""
+        try:
+            await self.db.executemany(_INSERT_ANALYSIS, [row for row, _ in batch])
+            # executemany doesn't report row ids, but this connection is the only
+            # writer, so the batch got consecutive ids ending at last_insert_rowid()
+            async with self.db.execute("SELECT last_insert_rowid()") as cursor:
+                last_id = (await cursor.fetchone())[0]
+            await self.db.commit()
+        except Exception:
+            # One bad row fails the whole group; retry row by row so only
+            # its own caller gets the error
+            await self.db.rollback()
+            await self._write_rows_singly(batch)
+            return
+        
+        self._write_generation += 1
+        first_id = last_id - len(batch) + 1
+        for offset, (_, future) in enumerate(batch):
+            # Skip callers that went away while the write was queued
+            if not future.done():
+                future.set_result(first_id + offset)
+    
+    async def _write_rows_singly(self, batch: List[Tuple[tuple, asyncio.Future]]):
+        """Insert rows one transaction each, failing only the rows that can't be written"""
+        for row, future in batch:
+            try:
+                async with self.db.execute(_INSERT_ANALYSIS, row) as cursor:
+                    row_id = cursor.lastrowid
+                await self.db.commit()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                await self.db.rollback()
+                continue
+            
+            self._write_generation += 1
+            if not future.done():
+                future.set_result(row_id)
     
     async def get_analysis(self, analysis_id: int) -> Optional[TextAnalysisResponse]:
         """Get a specific analysis by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT id, summary, title, topics, sentiment, keywords, created_at
-                FROM text_analyses WHERE id = ?
-            """, (analysis_id,)) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    return TextAnalysisResponse(
-                        summary=row[1],
-                        title=row[2],
-                        topics=json.loads(row[3]),
-                        sentiment=row[4],
-                        keywords=json.loads(row[5]),
-                        created_at=datetime.fromisoformat(row[6])
-                    )
-                return None
+        async with self.db.execute("""
+            SELECT id, summary, title, topics, sentiment, keywords, created_at
+            FROM text_analyses WHERE id = ?
+        """, (analysis_id,)) as cursor:
+            row = await cursor.fetchone()
+            if row:
+                return TextAnalysisResponse.model_construct(
+                    summary=row[1],
+                    title=row[2],
+                    topics=orjson.loads(row[3]),
+                    sentiment=row[4],
+                    keywords=orjson.loads(row[5]),
+                    created_at=datetime.fromisoformat(row[6])
+                )
+            return None
     
     async def search_analyses(self, search_request: SearchRequest) -> List[TextAnalysisResponse]:
         """Search analyses by keyword or sentiment"""
-        async with aiosqlite.connect(self.db_path) as db:
-            query = "SELECT id, summary, title, topics, sentiment, keywords, created_at FROM text_analyses WHERE 1=1"
-            params = []
-            
-            if search_request.keyword:
-                query += " AND (original_text LIKE ? OR summary LIKE ? OR topics LIKE ? OR keywords LIKE ?)"
-                keyword_param = f"%{search_request.keyword}%"
-                params.extend([keyword_param, keyword_param, keyword_param, keyword_param])
-            
-            if search_request.sentiment:
-                query += " AND sentiment = ?"
-                params.append(search_request.sentiment)
-            
-            query += " ORDER BY created_at DESC LIMIT ?"
-            params.append(search_request.limit)
-            
-            async with db.execute(query, params) as cursor:
-                rows = await cursor.fetchall()
-                results = []
-                for row in rows:
-                    results.append(TextAnalysisResponse(
-                        summary=row[1],
-                        title=row[2],
-                        topics=json.loads(row[3]),
-                        sentiment=row[4],
-                        keywords=json.loads(row[5]),
-                        created_at=datetime.fromisoformat(row[6])
-                    ))
-                return results
+        query = "SELECT id, summary, title, topics, sentiment, keywords, created_at FROM text_analyses WHERE 1=1"
+        params = []
+        
+        fts_query = self._fts_query(search_request.keyword) if search_request.keyword else None
+        if fts_query:
+            query += " AND id IN (SELECT rowid FROM text_analyses_fts WHERE text_analyses_fts MATCH ?)"
+            params.append(fts_query)
+        
+        if search_request.sentiment:
+            query += " AND sentiment = ?"
+            params.append(search_request.sentiment)
+        
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(search_request.limit)
+        
+        async with self.db.execute(query, params) as cursor:
+            return [
+                TextAnalysisResponse.model_construct(
+                    summary=row[1],
+                    title=row[2],
+                    topics=orjson.loads(row[3]),
+                    sentiment=row[4],
+                    keywords=orjson.loads(row[5]),
+                    created_at=datetime.fromisoformat(row[6])
+                )
+                async for row in cursor
+            ]
+    
+    @staticmethod
+    def _fts_query(keyword: str) -> str:
+        """Build an FTS5 query matching every word of keyword as a prefix"""
+        # Quote each term so user input can't inject FTS5 query syntax
+        return " ".join('"' + term.replace('"', '""') + '"*' for term in keyword.split())
     
     async def get_all_analyses(self, limit: int = 50) -> List[TextAnalysisResponse]:
         """Get all analyses with a limit"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT id, summary, title, topics, sentiment, keywords, created_at
-                FROM text_analyses 
-                ORDER BY created_at DESC 
-                LIMIT ?
-            """, (limit,)) as cursor:
-                rows = await cursor.fetchall()
-                results = []
-                for row in rows:
-                    results.append(TextAnalysisResponse(
-                        summary=row[1],
-                        title=row[2],
-                        topics=json.loads(row[3]),
-                        sentiment=row[4],
-                        keywords=json.loads(row[5]),
-                        created_at=datetime.fromisoformat(row[6])
-                    ))
-                return results
+        async with self.db.execute("""
+            SELECT id, summary, title, topics, sentiment, keywords, created_at
+            FROM text_analyses 
+            ORDER BY created_at DESC 
+            LIMIT ?
+        """, (limit,)) as cursor:
+            return [
+                TextAnalysisResponse.model_construct(
+                    summary=row[1],
+                    title=row[2],
+                    topics=orjson.loads(row[3]),
+                    sentiment=row[4],
+                    keywords=orjson.loads(row[5]),
+                    created_at=datetime.fromisoformat(row[6])
+                )
+                async for row in cursor
+            ]
     
     async def get_stats(self) -> Dict:
-        """Get database statistics"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Total analyses
-            async with db.execute("SELECT COUNT(*) FROM text_analyses") as cursor:
-                total_analyses = (await cursor.fetchone())[0]
-            
-            # Sentiment distribution
-            async with db.execute("""
-                SELECT sentiment, COUNT(*) 
-                FROM text_analyses 
-                GROUP BY sentiment
-            """) as cursor:
-                sentiment_counts = dict(await cursor.fetchall())
-            
-            return {
-                "total_analyses": total_analyses,
-                "sentiment_distribution": sentiment_counts
-            }
+        """Get database statistics, reusing a recent result for up to STATS_TTL seconds"""
+        if self._stats_cache is not None:
+            computed_at, generation, stats = self._stats_cache
+            if generation == self._write_generation and time.monotonic() - computed_at < self.STATS_TTL:
+                return stats
+        
+        generation = self._write_generation
+        
+        # Sentiment distribution, with the total derived from it so both
+        # come from one consistent snapshot
+        async with self.db.execute("""
+            SELECT sentiment, COUNT(*) 
+            FROM text_analyses 
+            GROUP BY sentiment
+        """) as cursor:
+            sentiment_counts = dict(await cursor.fetchall())
+        
+        stats = {
+            "total_analyses": sum(sentiment_counts.values()),
+            "sentiment_distribution": sentiment_counts
+        }
+        self._stats_cache = (time.monotonic(), generation, stats)
+        return stats
+
+def _tokenize(text: str) -> Set[str]:
+    """Split text into the lowercased words used by the mock search index"""
+    return set(re.findall(r'\w+', text.lower()))
 
 
 # Mock Database Service for testing
@@ -144,10 +321,18 @@ class MockDatabaseService:
     def __init__(self):
         self.analyses = []
         self.next_id = 1
+        # Inverted indexes: lowercased word -> ids, sentiment -> ids
+        self.kw_index: Dict[str, Set[int]] = defaultdict(set)
+        self.sent_index: Dict[str, Set[int]] = defaultdict(set)
+        # kw_index's words in sorted order, so a prefix's words are one bisect range
+        self.kw_words: List[str] = []
     
     async def init_db(self):
         pass
     
+    async def close(self):
+        pass
+    
     async def save_analysis(self, original_text: str, analysis_result: Dict) -> int:
         analysis_id = self.next_id
         self.next_id += 1
@@ -157,8 +342,24 @@ class MockDatabaseService:
             "analysis": analysis_result,
             "created_at": datetime.now()
         })
+        
+        searchable = " ".join([
+            original_text,
+            analysis_result["summary"],
+            *analysis_result["topics"],
+            *analysis_result["keywords"]
+        ])
+        for word in _tokenize(searchable):
+            if word not in self.kw_index:
+                bisect.insort(self.kw_words, word)
+            self.kw_index[word].add(analysis_id)
+        self.sent_index[analysis_result["sentiment"]].add(analysis_id)
+        
         return analysis_id
     
+    async def save_analyses(self, items: List[Tuple[str, Dict]]) -> List[int]:
+        return [await self.save_analysis(original_text, analysis_result) for original_text, analysis_result in items]
+    
     async def get_analysis(self, analysis_id: int) -> Optional[TextAnalysisResponse]:
         for analysis in self.analyses:
             if analysis["id"] == analysis_id:
@@ -174,24 +375,36 @@ class MockDatabaseService:
         return None
     
     async def search_analyses(self, search_request: SearchRequest) -> List[TextAnalysisResponse]:
+        candidates = None
+        
+        # Check keyword filter; like the FTS query, every word must match as a
+        # prefix, and a keyword with no words matches nothing
+        if search_request.keyword:
+            words = _tokenize(search_request.keyword)
+            if not words:
+                candidates = set()
+            for word in words:
+                ids = set()
+                i = bisect.bisect_left(self.kw_words, word)
+                while i < len(self.kw_words) and self.kw_words[i].startswith(word):
+                    ids |= self.kw_index[self.kw_words[i]]
+                    i += 1
+                candidates = ids if candidates is None else candidates & ids
+        
+        # Check sentiment filter
+        if search_request.sentiment:
+            ids = self.sent_index.get(search_request.sentiment, set())
+            candidates = ids if candidates is None else candidates & ids
+        
+        if candidates is None:
+            hits = self.analyses[:search_request.limit]
+        else:
+            # Ids are assigned sequentially from 1, so they index self.analyses
+            hits = [self.analyses[i - 1] for i in sorted(candidates)[:search_request.limit]]
+        
         results = []
-        for analysis in self.analyses:
+        for analysis in hits:
             result = analysis["analysis"]
-            text = analysis["original_text"]
-            
-            # Check keyword filter
-            if search_request.keyword:
-                keyword = search_request.keyword.lower()
-                if not (keyword in text.lower() or 
-                       keyword in result["summary"].lower() or
-                       any(keyword in topic.lower() for topic in result["topics"]) or
-                       any(keyword in kw.lower() for kw in result["keywords"])):
-                    continue
-            
-            # Check sentiment filter
-            if search_request.sentiment and result["sentiment"] != search_request.sentiment:
-                continue
-            
             results.append(TextAnalysisResponse(
                 summary=result["summary"],
                 title=result["title"],
@@ -200,9 +413,6 @@ class MockDatabaseService:
                 keywords=result["keywords"],
                 created_at=analysis["created_at"]
             ))
-            
-            if len(results) >= search_request.limit:
-                break
         
         return results
     
@@ -1,81 +1,156 @@
 import os
 import json
 import re
-from typing import Dict
-from openai import OpenAI
+import asyncio
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import tiktoken
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Markdown code fences the model sometimes wraps JSON in
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*')
+
+# Input budget per text, counted in model tokens
+MAX_INPUT_TOKENS = 3000
+
+# Short instructions keep per-call input tokens down; JSON mode enforces the format
+_SYSTEM_PROMPT = (
+    "Return JSON with keys summary (1-2 sentences), title (or null), "
+    "topics (3 strings), sentiment (positive|neutral|negative)."
+)
+_BATCH_SYSTEM_PROMPT = (
+    "For each numbered item return JSON {\"items\": [{id, summary (1-2 sentences), "
+    "title (or null), topics (3 strings), sentiment (positive|neutral|negative)}]}."
+)
+
+
+class LLMAnalysisError(Exception):
+    """Raised when the LLM call or its response parsing fails"""
+
 
 class LLMService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = "gpt-3.5-turbo"
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.model = "gpt-4o-mini"
+        # Set by load_encoding at startup
+        self.encoding: Optional[tiktoken.Encoding] = None
+    
+    async def load_encoding(self):
+        """
+        Load the model's tokenizer once, off the event loop; tiktoken may
+        download its files on first use. Raises if it can't be loaded.
+        """
+        self.encoding = await asyncio.to_thread(tiktoken.encoding_for_model, self.model)
+    
+    async def close(self):
+        """Close the API client's connections"""
+        await self.client.close()
     
     async def analyze_text(self, text: str) -> Dict:
         """
         Analyze text using LLM to extract summary, title, topics, and sentiment
         """
         try:
-            # Create the prompt for the LLM
-            prompt = f"""
-            Analyze the following text and provide a structured response in JSON format:
-            
-            Text: "{text[:2000]}"  # Limit text to avoid token limits
-            
-            Please provide a JSON response with the following structure:
-            {{
-                "summary": "A 1-2 sentence summary of the text",
-                "title": "A descriptive title for the text (or null if not applicable)",
-                "topics": ["topic1", "topic2", "topic3"],
-                "sentiment": "positive/neutral/negative"
-            }}
-            
-            Guidelines:
-            - Summary should be concise and capture the main points
-            - Title should be descriptive and relevant
-            - Topics should be the 3 most important themes or subjects
-            - Sentiment should be one of: positive, neutral, negative
-            - Return only valid JSON, no additional text
-            """
-            
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "You are a helpful assistant that analyzes text and returns structured JSON data."},
-                    {"role": "user", "content": prompt}
+                    {"role": "system", "content": _SYSTEM_PROMPT},
+                    {"role": "user", "content": self._truncate(text)}
                 ],
+                response_format={"type": "json_object"},
                 temperature=0.3,
                 max_tokens=500
             )
             
             # Parse the JSON response
-            content = response.choices[0].message.content.strip()
-            
-            # Clean up the response to ensure it's valid JSON
-            content = self._clean_json_response(content)
-            
-            result = json.loads(content)
+            result = self._parse_json(response.choices[0].message.content)
             
             # Validate the response structure
             return self._validate_response(result)
             
         except Exception as e:
             print(f"Error in LLM analysis: {e}")
-            # Return a fallback response
-            return {
-                "summary": "Unable to generate summary due to processing error.",
-                "title": None,
-                "topics": ["analysis", "error", "processing"],
-                "sentiment": "neutral"
-            }
+            # Raise rather than return a placeholder, so callers don't cache a failure
+            raise LLMAnalysisError(f"LLM analysis failed: {e}") from e
+    
+    async def analyze_batch(self, texts: List[str]) -> List[Dict]:
+        """
+        Analyze several texts with a single LLM call, returning one result per text in order
+        """
+        if len(texts) == 1:
+            return [await self.analyze_text(texts[0])]
+        
+        try:
+            items = "\n".join(f"{i}: {json.dumps(self._truncate(text))}" for i, text in enumerate(texts, 1))
+            
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": _BATCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"ITEMS:\n{items}"}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.3,
+                max_tokens=500 * len(texts)
+            )
+            
+            parsed = self._parse_json(response.choices[0].message.content)
+            
+            # Key results by id so a reordered or partial array still lines up
+            by_id = {}
+            for item in parsed.get("items", []):
+                if not isinstance(item, dict):
+                    continue
+                # JSON mode often returns ids as strings
+                try:
+                    by_id[int(item["id"])] = item
+                except (KeyError, TypeError, ValueError):
+                    continue
+            
+            results = {}
+            for i, item in by_id.items():
+                if 1 <= i <= len(texts):
+                    item.pop("id", None)
+                    try:
+                        results[i] = self._validate_response(item)
+                    except ValueError:
+                        # Analyzed again on its own below
+                        continue
+            
+        except Exception as e:
+            print(f"Error in LLM batch analysis: {e}")
+            raise LLMAnalysisError(f"LLM batch analysis failed: {e}") from e
+        
+        # Texts the model left out are analyzed on their own
+        missing = [i for i in range(1, len(texts) + 1) if i not in results]
+        retried = await asyncio.gather(*(self.analyze_text(texts[i - 1]) for i in missing))
+        results.update(zip(missing, retried))
+        return [results[i] for i in range(1, len(texts) + 1)]
+    
+    def _truncate(self, text: str) -> str:
+        """Limit text to MAX_INPUT_TOKENS tokens to stay within the model's budget"""
+        if self.encoding is None:
+            raise RuntimeError("Tokenizer not loaded; call load_encoding() at startup")
+        # Treat special-token strings in user text as plain text
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= MAX_INPUT_TOKENS:
+            return text
+        return self.encoding.decode(tokens[:MAX_INPUT_TOKENS])
+    
+    def _parse_json(self, content: str) -> Dict:
+        """Parse a JSON-mode response, cleaning it up only if it isn't valid JSON as-is"""
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            return json.loads(self._clean_json_response(content.strip()))
     
     def _clean_json_response(self, content: str) -> str:
         """Clean and extract JSON from LLM response"""
         # Remove any markdown formatting
-        content = re.sub(r'```json\s*', '', content)
-        content = re.sub(r'```\s*', '', content)
+        content = _JSON_FENCE_RE.sub('', content)
         
         # Find JSON object boundaries
         start = content.find('{')
@@ -103,10 +178,20 @@ class LLMService:
         if "title" not in result:
             result["title"] = None
         
-        # Ensure topics is a list with exactly 3 items
+        # Responses are built from this result without revalidation, so
+        # reject a summary or title of the wrong type
+        if result["summary"] is None:
+            result["summary"] = "Summary not available"
+        if not isinstance(result["summary"], str):
+            raise ValueError("LLM returned a non-string summary")
+        if result["title"] is not None and not isinstance(result["title"], str):
+            raise ValueError("LLM returned a non-string title")
+        
+        # Ensure topics is a list with exactly 3 string items
         if not isinstance(result["topics"], list):
             result["topics"] = ["general", "content", "analysis"]
-        elif len(result["topics"]) != 3:
+        else:
+            result["topics"] = [topic for topic in result["topics"] if isinstance(topic, str)]
             # Pad or truncate to exactly 3 topics
             while len(result["topics"]) < 3:
                 result["topics"].append("general")
@@ -120,16 +205,143 @@ class LLMService:
         return result
 
 
+class BatchingLLMService:
+    """
+    Coalesce concurrent analyze_text calls into batched LLM requests.
+    
+    Callers are queued and a background worker sends up to MAX_BATCH texts
+    in one chat completion, waiting at most MAX_WAIT_MS for a batch to fill.
+    Each batch is sent as its own task, so several can be in flight at once.
+    """
+    MAX_BATCH = 8
+    MAX_WAIT_MS = 50
+    
+    def __init__(self, llm_service):
+        self.llm_service = llm_service
+        self._queue = None
+        self._worker = None
+        # Batches in flight, referenced so they aren't garbage collected mid-call
+        self._batches = set()
+    
+    async def load_encoding(self):
+        """Load the wrapped service's tokenizer"""
+        await self.llm_service.load_encoding()
+    
+    async def close(self):
+        """Stop the worker and any batches in flight, then close the wrapped service"""
+        tasks = list(self._batches)
+        if self._worker is not None:
+            tasks.append(self._worker)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+        
+        # Callers still queued won't get a result now
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+        
+        await self.llm_service.close()
+    
+    async def analyze_text(self, text: str) -> Dict:
+        """Queue text for the next batch and wait for its result"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+    
+    async def analyze_batch(self, texts: List[str]) -> List[Dict]:
+        """Analyze a known list of texts directly, in chunks of MAX_BATCH"""
+        chunks = [texts[i:i + self.MAX_BATCH] for i in range(0, len(texts), self.MAX_BATCH)]
+        results = await asyncio.gather(*(self.llm_service.analyze_batch(chunk) for chunk in chunks))
+        return [result for chunk_results in results for result in chunk_results]
+    
+    async def _run(self):
+        """Drain the queue into batches and start each one until cancelled"""
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.MAX_WAIT_MS / 1000
+                
+                while len(batch) < self.MAX_BATCH:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                
+                # Past the deadline, still take anything already queued
+                while len(batch) < self.MAX_BATCH and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                
+                task = asyncio.create_task(self._send_batch(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+                batch = []
+        except asyncio.CancelledError:
+            # Callers collected but not yet sent won't get a result now
+            for _, future in batch:
+                future.cancel()
+            raise
+    
+    async def _send_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Analyze one batch and resolve its callers' futures"""
+        texts = [text for text, _ in batch]
+        try:
+            results = await self.llm_service.analyze_batch(texts)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            # Skip callers that went away while the batch was in flight
+            if not future.done():
+                future.set_result(result)
+
+
+@lru_cache(maxsize=128)
+def _mock_analysis(text: str) -> Tuple[Tuple[str, object], ...]:
+    """Canned mock analysis as immutable pairs, memoized since it is deterministic"""
+    return (
+        ("summary", f"This is a mock summary for text containing {len(text)} characters."),
+        ("title", "Mock Title"),
+        ("topics", ("technology", "analysis", "mock")),
+        ("sentiment", "neutral")
+    )
+
+
 # Mock LLM Service for testing without API key
 class MockLLMService:
     def __init__(self):
         pass
     
+    async def load_encoding(self):
+        pass
+    
+    async def close(self):
+        pass
+    
     async def analyze_text(self, text: str) -> Dict:
         """Mock implementation for testing"""
-        return {
-            "summary": f"This is a mock summary for text containing {len(text)} characters.",
-            "title": "Mock Title",
-            "topics": ["technology", "analysis", "mock"],
-            "sentiment": "neutral"
-        }
+        result = dict(_mock_analysis(text))
+        # Fresh list so callers can't modify the cached topics
+        result["topics"] = list(result["topics"])
+        return result
+    
+    async def analyze_batch(self, texts: List[str]) -> List[Dict]:
+        """Mock implementation for testing"""
+        return [await self.analyze_text(text) for text in texts]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import List, Optional
 from datetime import datetime
 
@@ -14,7 +14,27 @@ class TextAnalysisRequest(BaseModel):
         return v
 
 
+# Most texts accepted by /analyze_batch, which bounds the LLM calls one request can start
+MAX_BATCH_TEXTS = 32
+
+
+class BatchAnalysisRequest(BaseModel):
+    texts: List[str] = Field(..., max_length=MAX_BATCH_TEXTS)
+    
+    @field_validator('texts')
+    @classmethod
+    def validate_texts(cls, v):
+        if not v:
+            raise ValueError('Texts cannot be empty')
+        if any(not text or not text.strip() for text in v):
+            raise ValueError('Text cannot be empty')
+        return v
+
+
 class TextAnalysisResponse(BaseModel):
+    # Built from trusted service/database data, usually via model_construct
+    model_config = ConfigDict(frozen=True)
+    
     summary: str
     title: Optional[str]
     topics: List[str]
@@ -1,118 +1,197 @@
+import os
 import re
+import asyncio
 import collections
-from typing import List, Dict
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.tag import pos_tag
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import spacy
+from spacy.lang.en.stop_words import STOP_WORDS
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+# Includes common words that aren't useful as keywords
+_STOPWORDS = frozenset(STOP_WORDS) | {
+    'said', 'says', 'would', 'could', 'should', 'will', 'can', 'may', 'might'
+}
 
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+# Nouns (including proper nouns)
+_NOUN_POS = frozenset({'NOUN', 'PROPN'})
 
-try:
-    nltk.data.find('taggers/averaged_perceptron_tagger')
-except LookupError:
-    nltk.download('averaged_perceptron_tagger')
+_URL_RE = re.compile(r'http[s]?://\S+')
+_EMAIL_RE = re.compile(r'\S+@\S+')
+_WS_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'\b[a-zA-Z]{3,}\b')
+
+
+@lru_cache(maxsize=None)
+def _get_nlp() -> spacy.Language:
+    """Load the spaCy pipeline once per process, with unused components disabled"""
+    return spacy.load("en_core_web_sm", disable=["parser", "ner", "lemmatizer"])
+
+
+def _init_worker():
+    """Load the spaCy pipeline in each pool worker before it takes work"""
+    _get_nlp()
+
+
+def _top_nouns(doc, num_keywords: int) -> List[str]:
+    """Pick the most frequent nouns in a processed doc"""
+    # Filter out stop words and short words
+    filtered_tokens = [
+        token for token in doc
+        if token.is_alpha
+        and len(token) > 2
+        and token.lower_ not in _STOPWORDS
+    ]
+    
+    # Count noun frequency
+    noun_counts = collections.Counter(
+        token.lower_ for token in filtered_tokens
+        if token.pos_ in _NOUN_POS
+    )
+    
+    # Get most common nouns, just the words, not the counts
+    keywords = [word for word, count in noun_counts.most_common(num_keywords)]
+    
+    # If we don't have enough nouns, fill with other frequent words
+    if len(keywords) < num_keywords:
+        all_word_counts = collections.Counter(token.lower_ for token in filtered_tokens)
+        additional_words = [
+            word for word, count in all_word_counts.most_common(num_keywords * 2)
+            if word not in keywords
+        ]
+        keywords.extend(additional_words[:num_keywords - len(keywords)])
+    
+    return keywords[:num_keywords]
+
+
+def _extract_keywords(text: str, num_keywords: int) -> Tuple[str, ...]:
+    """Extract the most frequent nouns from text using simple NLP"""
+    try:
+        text = _clean_text(text)
+        return tuple(_top_nouns(_get_nlp()(text), num_keywords))
+        
+    except Exception as e:
+        print(f"Error in keyword extraction: {e}")
+        # Fallback: return simple word frequency
+        return tuple(_fallback_keywords(text, num_keywords))
+
+
+def _extract_keywords_batch(texts: List[str], num_keywords: int) -> List[List[str]]:
+    """Extract keywords for several texts in one pass over the spaCy pipeline"""
+    try:
+        docs = _get_nlp().pipe((_clean_text(text) for text in texts), batch_size=32)
+        return [_top_nouns(doc, num_keywords) for doc in docs]
+        
+    except Exception as e:
+        print(f"Error in batch keyword extraction: {e}")
+        return [_fallback_keywords(text, num_keywords) for text in texts]
+
+
+def _clean_text(text: str) -> str:
+    """Clean text for processing"""
+    # Remove URLs
+    text = _URL_RE.sub('', text)
+    # Remove email addresses
+    text = _EMAIL_RE.sub('', text)
+    # Remove extra whitespace
+    text = _WS_RE.sub(' ', text)
+    return text.strip()
+
+
+def _fallback_keywords(text: str, num_keywords: int) -> List[str]:
+    """Fallback keyword extraction using simple word frequency"""
+    try:
+        # Simple word frequency approach
+        words = _WORD_RE.findall(text.lower())
+        word_counts = collections.Counter(words)
+        
+        # Remove common words
+        common_words = {'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his', 'how', 'its', 'may', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy', 'did', 'man', 'men', 'put', 'say', 'she', 'too', 'use'}
+        filtered_words = {word: count for word, count in word_counts.items() if word not in common_words}
+        
+        most_common = collections.Counter(filtered_words).most_common(num_keywords)
+        return [word for word, count in most_common]
+        
+    except Exception:
+        return ["text", "content", "analysis"]
 
 
 class NLPService:
-    def __init__(self):
-        self.stop_words = set(stopwords.words('english'))
-        # Add common words that aren't useful as keywords
-        self.stop_words.update(['said', 'says', 'would', 'could', 'should', 'will', 'can', 'may', 'might'])
+    # Keyword results kept in this process, keyed on (text, num_keywords),
+    # so repeated texts skip the worker round trip entirely
+    CACHE_SIZE = 4096
     
-    def extract_keywords(self, text: str, num_keywords: int = 3) -> List[str]:
+    def __init__(self, max_workers: int = None):
+        # Tagging is CPU-bound, so run it in worker processes to keep it
+        # off the event loop and out of the GIL
+        self.pool = ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            initializer=_init_worker
+        )
+        self._keyword_cache: "collections.OrderedDict[Tuple[str, int], Tuple[str, ...]]" = collections.OrderedDict()
+    
+    async def extract_keywords(self, text: str, num_keywords: int = 3) -> List[str]:
         """
         Extract the most frequent nouns from text using simple NLP
         """
-        try:
-            # Clean and tokenize the text
-            text = self._clean_text(text)
-            tokens = word_tokenize(text.lower())
-            
-            # Filter out stop words and short words
-            filtered_tokens = [
-                token for token in tokens 
-                if token not in self.stop_words 
-                and len(token) > 2 
-                and token.isalpha()
-            ]
-            
-            # Tag parts of speech
-            pos_tags = pos_tag(filtered_tokens)
-            
-            # Extract nouns (including proper nouns)
-            nouns = [
-                word for word, pos in pos_tags 
-                if pos in ['NN', 'NNS', 'NNP', 'NNPS']
-            ]
-            
-            # Count frequency
-            noun_counts = collections.Counter(nouns)
-            
-            # Get most common nouns
-            most_common = noun_counts.most_common(num_keywords)
-            
-            # Return just the words, not the counts
-            keywords = [word for word, count in most_common]
-            
-            # If we don't have enough nouns, fill with other frequent words
-            if len(keywords) < num_keywords:
-                all_word_counts = collections.Counter(filtered_tokens)
-                additional_words = [
-                    word for word, count in all_word_counts.most_common(num_keywords * 2)
-                    if word not in keywords
-                ]
-                keywords.extend(additional_words[:num_keywords - len(keywords)])
-            
-            return keywords[:num_keywords]
-            
-        except Exception as e:
-            print(f"Error in keyword extraction: {e}")
-            # Fallback: return simple word frequency
-            return self._fallback_keywords(text, num_keywords)
+        key = (text, num_keywords)
+        keywords = self._cached_keywords(key)
+        if keywords is None:
+            loop = asyncio.get_running_loop()
+            keywords = await loop.run_in_executor(self.pool, _extract_keywords, text, num_keywords)
+            self._cache_keywords(key, keywords)
+        return list(keywords)
+    
+    async def extract_keywords_batch(self, texts: List[str], num_keywords: int = 3) -> List[List[str]]:
+        """
+        Extract keywords for several texts, amortizing pipeline overhead across them
+        """
+        keys = [(text, num_keywords) for text in texts]
+        results = [self._cached_keywords(key) for key in keys]
+        
+        # Only texts without a cached result go through the pipeline
+        misses = [i for i, keywords in enumerate(results) if keywords is None]
+        if misses:
+            loop = asyncio.get_running_loop()
+            extracted = await loop.run_in_executor(
+                self.pool, _extract_keywords_batch, [texts[i] for i in misses], num_keywords
+            )
+            for i, keywords in zip(misses, extracted):
+                results[i] = tuple(keywords)
+                self._cache_keywords(keys[i], results[i])
+        
+        return [list(keywords) for keywords in results]
     
-    def _clean_text(self, text: str) -> str:
-        """Clean text for processing"""
-        # Remove URLs
-        text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-        # Remove email addresses
-        text = re.sub(r'\S+@\S+', '', text)
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
+    def _cached_keywords(self, key: Tuple[str, int]) -> Optional[Tuple[str, ...]]:
+        """Look up a memoized keyword result, marking it recently used"""
+        keywords = self._keyword_cache.get(key)
+        if keywords is not None:
+            self._keyword_cache.move_to_end(key)
+        return keywords
     
-    def _fallback_keywords(self, text: str, num_keywords: int) -> List[str]:
-        """Fallback keyword extraction using simple word frequency"""
-        try:
-            # Simple word frequency approach
-            words = re.findall(r'\b[a-zA-Z]{3,}\b', text.lower())
-            word_counts = collections.Counter(words)
-            
-            # Remove common words
-            common_words = {'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had', 'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his', 'how', 'its', 'may', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy', 'did', 'man', 'men', 'put', 'say', 'she', 'too', 'use'}
-            filtered_words = {word: count for word, count in word_counts.items() if word not in common_words}
-            
-            most_common = collections.Counter(filtered_words).most_common(num_keywords)
-            return [word for word, count in most_common]
-            
-        except Exception:
-            return ["text", "content", "analysis"]
-
-
-# Mock NLP Service for testing without NLTK
+    def _cache_keywords(self, key: Tuple[str, int], keywords: Tuple[str, ...]):
+        """Memoize a keyword result, evicting the least recently used if full"""
+        self._keyword_cache[key] = keywords
+        if len(self._keyword_cache) > self.CACHE_SIZE:
+            self._keyword_cache.popitem(last=False)
+    
+    def close(self):
+        """Shut down the worker pool"""
+        self.pool.shutdown()
+
+
+# Mock NLP Service for testing without spaCy
 class MockNLPService:
     def __init__(self):
         pass
     
-    def extract_keywords(self, text: str, num_keywords: int = 3) -> List[str]:
+    async def extract_keywords(self, text: str, num_keywords: int = 3) -> List[str]:
         """Mock implementation for testing"""
         return ["mock", "keyword", "extraction"]
+    
+    async def extract_keywords_batch(self, texts: List[str], num_keywords: int = 3) -> List[List[str]]:
+        """Mock implementation for testing"""
+        return [await self.extract_keywords(text, num_keywords) for text in texts]
+    
+    def close(self):
+        pass
@@ -1,179 +1,699 @@
 import pytest
 import asyncio
-from fastapi.testclient import TestClient
-from app import app
-from llm_service import MockLLMService
-from nlp_service import MockNLPService
-from database import MockDatabaseService
+import sqlite3
+import httpx
+import orjson
+import jsonschema
+from types import MappingProxyType, SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+import nlp_service
+from llm_service import LLMService, LLMAnalysisError, MockLLMService, BatchingLLMService
+from nlp_service import NLPService
+from database import DatabaseService
+from cache_service import CacheService
+from models import MAX_BATCH_TEXTS, SearchRequest, TextAnalysisRequest
 
-# Use mock services for testing
-app.llm_service = MockLLMService()
-app.nlp_service = MockNLPService()
-app.db_service = MockDatabaseService()
 
-client = TestClient(app)
+# Analysis result saved by the database service tests. The mock database
+# stores it by reference, so it is a read-only view with tuple values.
+CANNED_ANALYSIS = MappingProxyType({
+    "summary": "Test summary",
+    "title": "Test title",
+    "topics": ("test", "analysis", "mock"),
+    "sentiment": "neutral",
+    "keywords": ("test", "keyword", "extraction")
+})
 
 
-def test_health_check():
+# Response shapes, compiled once and checked with a single validate() call
+ANALYZE_VALIDATOR = jsonschema.Draft202012Validator({
+    "type": "object",
+    "required": ["summary", "title", "topics", "sentiment", "keywords", "created_at"],
+    "properties": {
+        "summary": {"type": "string"},
+        "topics": {"type": "array", "items": {"type": "string"}, "minItems": 3, "maxItems": 3},
+        "sentiment": {"enum": ["positive", "neutral", "negative"]},
+        "keywords": {"type": "array", "items": {"type": "string"}, "minItems": 3, "maxItems": 3}
+    }
+})
+
+STATS_VALIDATOR = jsonschema.Draft202012Validator({
+    "type": "object",
+    "required": ["total_analyses", "sentiment_distribution"],
+    "properties": {
+        "total_analyses": {"type": "integer"},
+        "sentiment_distribution": {"type": "object"}
+    }
+})
+
+
+def j(response):
+    """Parse a response body once, with orjson"""
+    return orjson.loads(response.content)
+
+
+@pytest.fixture(scope="module")
+async def seed_analyses(mock_db):
+    """Store a few analyses once per module, directly in the mock database"""
+    seeds = [
+        ("This is a positive article about technology.", "positive"),
+        ("This is a negative article about problems.", "negative"),
+        ("This is a neutral article about facts.", "neutral")
+    ]
+    await mock_db.save_analyses([
+        (text, {
+            "summary": f"Seeded summary: {text}",
+            "title": "Seeded article",
+            "topics": ["seed", "article", sentiment],
+            "sentiment": sentiment,
+            "keywords": ["seed", "keyword", "article"]
+        })
+        for text, sentiment in seeds
+    ])
+
+
+@pytest.fixture(scope="session")
+async def aclient(fastapi_app):
+    """One HTTP client per session, talking to the app in-process on the test event loop"""
+    # ASGITransport sends no lifespan events, so startup/shutdown never run here;
+    # that's fine because the mock services need no init_db or close
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=fastapi_app), base_url="http://test") as c:
+        yield c
+
+
+async def test_health_check(aclient):
     """Test the health check endpoint"""
-    response = client.get("/health")
+    response = await aclient.get("/health")
     assert response.status_code == 200
-    data = response.json()
+    data = j(response)
     assert data["status"] == "healthy"
     assert "timestamp" in data
     assert "services" in data
 
 
-def test_analyze_text_success():
+async def test_analyze_text_success(aclient):
     """Test successful text analysis"""
     test_text = "This is a test article about artificial intelligence and machine learning. The technology is advancing rapidly and shows great promise for the future."
     
-    response = client.post("/analyze", json={"text": test_text})
+    response = await aclient.post("/analyze", json={"text": test_text})
     assert response.status_code == 200
     
-    data = response.json()
-    assert "summary" in data
-    assert "title" in data
-    assert "topics" in data
-    assert "sentiment" in data
-    assert "keywords" in data
-    assert "created_at" in data
-    
-    # Validate data types and structure
-    assert isinstance(data["summary"], str)
-    assert isinstance(data["topics"], list)
-    assert len(data["topics"]) == 3
-    assert data["sentiment"] in ["positive", "neutral", "negative"]
-    assert isinstance(data["keywords"], list)
-    assert len(data["keywords"]) == 3
-
-
-def test_analyze_text_empty():
-    """Test analysis with empty text"""
-    response = client.post("/analyze", json={"text": ""})
-    assert response.status_code == 422
-    # Check that validation error contains the expected message
-    error_detail = response.json()["detail"][0]
-    assert "Text cannot be empty" in error_detail["msg"]
+    ANALYZE_VALIDATOR.validate(j(response))
 
 
-def test_analyze_text_whitespace():
-    """Test analysis with whitespace-only text"""
-    response = client.post("/analyze", json={"text": "   \n\t   "})
+@pytest.mark.parametrize("payload", ["", "   \n\t   "])
+async def test_analyze_text_rejects_blank(aclient, payload):
+    """Test analysis with empty or whitespace-only text"""
+    response = await aclient.post("/analyze", json={"text": payload})
     assert response.status_code == 422
     # Check that validation error contains the expected message
-    error_detail = response.json()["detail"][0]
+    error_detail = j(response)["detail"][0]
     assert "Text cannot be empty" in error_detail["msg"]
 
 
-def test_search_analyses():
-    """Test searching analyses"""
-    # First, create some test data
-    test_texts = [
-        "This is a positive article about technology.",
-        "This is a negative article about problems.",
-        "This is a neutral article about facts."
+async def test_analyze_batch(aclient):
+    """Test analyzing several texts in one request"""
+    texts = [
+        "The first article in a batch, about renewable energy.",
+        "The second article in a batch, about space exploration."
     ]
     
-    for text in test_texts:
-        client.post("/analyze", json={"text": text})
+    response = await aclient.post("/analyze_batch", json={"texts": texts})
+    assert response.status_code == 200
     
+    data = j(response)
+    assert isinstance(data, list)
+    assert len(data) == 2
+    for item in data:
+        assert len(item["topics"]) == 3
+        assert len(item["keywords"]) == 3
+        assert item["sentiment"] in ["positive", "neutral", "negative"]
+
+
+async def test_analyze_batch_empty(aclient):
+    """Test batch analysis with no texts"""
+    response = await aclient.post("/analyze_batch", json={"texts": []})
+    assert response.status_code == 422
+    error_detail = j(response)["detail"][0]
+    assert "Texts cannot be empty" in error_detail["msg"]
+
+
+async def test_analyze_batch_too_many(aclient):
+    """Test batch analysis with more texts than one request may hold"""
+    texts = [f"Article number {i}." for i in range(MAX_BATCH_TEXTS + 1)]
+    response = await aclient.post("/analyze_batch", json={"texts": texts})
+    assert response.status_code == 422
+    assert j(response)["detail"][0]["type"] == "too_long"
+
+
+async def test_search_analyses(aclient, seed_analyses):
+    """Test searching analyses"""
     # Test search by sentiment
-    response = client.post("/search", json={"sentiment": "positive", "limit": 10})
+    response = await aclient.post("/search", json={"sentiment": "positive", "limit": 10})
     assert response.status_code == 200
-    data = response.json()
+    data = j(response)
     assert "results" in data
     assert "total" in data
     assert isinstance(data["results"], list)
+    assert data["results"]
+    assert all(result["sentiment"] == "positive" for result in data["results"])
 
 
-def test_get_all_analyses():
+async def test_get_all_analyses(aclient, seed_analyses):
     """Test getting all analyses"""
-    response = client.get("/analyses")
+    response = await aclient.get("/analyses")
     assert response.status_code == 200
-    data = response.json()
+    data = j(response)
     assert "results" in data
     assert "total" in data
     assert isinstance(data["results"], list)
 
 
-def test_get_stats():
+async def test_get_stats(aclient, seed_analyses):
     """Test getting statistics"""
-    response = client.get("/stats")
+    response = await aclient.get("/stats")
     assert response.status_code == 200
-    data = response.json()
-    assert "total_analyses" in data
-    assert "sentiment_distribution" in data
-    assert isinstance(data["total_analyses"], int)
-    assert isinstance(data["sentiment_distribution"], dict)
+    STATS_VALIDATOR.validate(j(response))
+
 
+async def test_search_analyses_direct(mock_db, seed_analyses):
+    """Test sentiment filtering against the database service directly"""
+    results = await mock_db.search_analyses(SearchRequest(sentiment="positive", limit=10))
+    assert results
+    assert all(result.sentiment == "positive" for result in results)
 
-def test_web_interface():
+
+async def test_get_stats_direct(mock_db, seed_analyses):
+    """Test statistics against the database service directly"""
+    stats = await mock_db.get_stats()
+    assert stats["total_analyses"] >= 3
+    assert stats["sentiment_distribution"]["positive"] >= 1
+    assert sum(stats["sentiment_distribution"].values()) == stats["total_analyses"]
+
+
+async def test_web_interface(aclient):
     """Test the web interface loads"""
-    response = client.get("/")
+    response = await aclient.get("/")
     assert response.status_code == 200
     assert "text/html" in response.headers["content-type"]
-    assert "LLM Knowledge Extractor" in response.text
+    assert b"LLM Knowledge Extractor" in response.content
 
 
 # Test individual services
-def test_mock_llm_service():
+async def test_mock_llm_service(mock_llm):
     """Test the mock LLM service"""
-    service = MockLLMService()
+    result = await mock_llm.analyze_text("Test text")
+    assert "summary" in result
+    assert "title" in result
+    assert "topics" in result
+    assert "sentiment" in result
+    assert len(result["topics"]) == 3
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """LLMService whose chat completions return canned content, with no network access"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    service = LLMService()
+    monkeypatch.setattr(service, "_truncate", lambda text: text)
+    
+    def reply(*contents):
+        """Answer successive completions with contents in order; an exception is raised instead"""
+        replies = iter(contents)
+        
+        async def create(**kwargs):
+            content = next(replies)
+            if isinstance(content, Exception):
+                raise content
+            message = SimpleNamespace(content=content)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        
+        service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        return service
     
-    async def test_analysis():
-        result = await service.analyze_text("Test text")
-        assert "summary" in result
-        assert "title" in result
-        assert "topics" in result
-        assert "sentiment" in result
-        assert len(result["topics"]) == 3
+    return reply
+
+
+async def test_llm_analyze_batch_parsing(stub_llm):
+    """Test that batch results line up by id, whether reordered, missing, or given as strings"""
+    service = stub_llm(
+        orjson.dumps({"items": [
+            {"id": "3", "summary": "Third", "title": None, "topics": ["a", "b", "c"], "sentiment": "negative"},
+            {"id": 1, "summary": "First", "title": "One", "topics": ["d", "e", "f"], "sentiment": "positive"}
+        ]}).decode(),
+        # The missing second item is requested on its own
+        orjson.dumps({"summary": "Second", "title": None, "topics": ["g", "h", "i"], "sentiment": "neutral"}).decode()
+    )
+    
+    results = await service.analyze_batch(["first", "second", "third"])
+    assert [result["summary"] for result in results] == ["First", "Second", "Third"]
+    assert results[0]["sentiment"] == "positive"
+    assert results[2]["sentiment"] == "negative"
+    assert "id" not in results[0]
+
+
+async def test_llm_result_types_checked(stub_llm):
+    """Test that malformed LLM fields are coerced or rejected before anything uses them"""
+    service = stub_llm(
+        orjson.dumps({"summary": None, "title": None, "topics": ["x", 2, {"k": 1}], "sentiment": "positive"}).decode(),
+        orjson.dumps({"summary": "Fine", "title": 5, "topics": ["x"], "sentiment": "positive"}).decode()
+    )
+    
+    result = await service.analyze_text("first")
+    assert result["summary"] == "Summary not available"
+    assert result["topics"] == ["x", "general", "general"]
+    
+    with pytest.raises(LLMAnalysisError):
+        await service.analyze_text("second")
+
+
+async def test_llm_failure_raises(stub_llm):
+    """Test that LLM failures raise instead of returning a placeholder analysis"""
+    service = stub_llm(RuntimeError("upstream unavailable"), "not json")
+    
+    with pytest.raises(LLMAnalysisError):
+        await service.analyze_batch(["first", "second"])
+    with pytest.raises(LLMAnalysisError):
+        await service.analyze_text("third")
+
+
+async def test_llm_requires_loaded_encoding(monkeypatch):
+    """Test that analysis fails, rather than calling the API, before the tokenizer is loaded"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    service = LLMService()
+    
+    async def create(**kwargs):
+        raise AssertionError("API called without a tokenizer")
+    
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    with pytest.raises(LLMAnalysisError, match="Tokenizer not loaded"):
+        await service.analyze_text("Some text")
+
+
+async def test_failed_analysis_not_cached(aclient, app_module, monkeypatch):
+    """Test that a failed analysis is reported and retried on the next request, not cached"""
+    calls = []
+    
+    class FlakyLLMService(MockLLMService):
+        async def analyze_text(self, text):
+            calls.append(text)
+            if len(calls) == 1:
+                raise LLMAnalysisError("upstream unavailable")
+            return await super().analyze_text(text)
     
-    asyncio.run(test_analysis())
+    monkeypatch.setattr(app_module, "llm_service", FlakyLLMService())
+    payload = {"text": "A text analyzed while the LLM backend is failing."}
+    response = await aclient.post("/analyze", json=payload)
+    assert response.status_code == 500
+    
+    response = await aclient.post("/analyze", json=payload)
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+async def test_unsaved_analysis_not_cached(aclient, app_module, mock_db, monkeypatch):
+    """Test that a result is only cached once it has been saved"""
+    calls = []
+    
+    class CountingLLMService(MockLLMService):
+        async def analyze_text(self, text):
+            calls.append(text)
+            return await super().analyze_text(text)
+    
+    async def save_analysis(original_text, analysis_result):
+        raise RuntimeError("database unavailable")
+    
+    monkeypatch.setattr(app_module, "llm_service", CountingLLMService())
+    payload = {"text": "A text analyzed while the database is failing."}
+    with monkeypatch.context() as patch:
+        patch.setattr(mock_db, "save_analysis", save_analysis)
+        response = await aclient.post("/analyze", json=payload)
+        assert response.status_code == 500
+    
+    response = await aclient.post("/analyze", json=payload)
+    assert response.status_code == 200
+    assert len(calls) == 2
 
 
-def test_mock_nlp_service():
+async def test_batching_llm_service():
+    """Test that concurrent calls are coalesced into batches"""
+    mock = MockLLMService()
+    batches = []
+    
+    async def analyze_batch(texts):
+        batches.append(texts)
+        return [await mock.analyze_text(text) for text in texts]
+    
+    mock.analyze_batch = analyze_batch
+    service = BatchingLLMService(mock)
+    
+    texts = ["text" + "!" * i for i in range(10)]
+    try:
+        results = await asyncio.gather(*(service.analyze_text(text) for text in texts))
+        assert len(results) == 10
+        for text, result in zip(texts, results):
+            assert str(len(text)) in result["summary"]
+        # 10 concurrent calls fit in two batches of at most MAX_BATCH
+        assert [len(batch) for batch in batches] == [8, 2]
+    finally:
+        await service.close()
+
+
+async def test_batching_llm_service_overlaps_batches():
+    """Test that a batch is sent without waiting for the previous one to finish"""
+    mock = MockLLMService()
+    spans = []
+    
+    async def analyze_batch(texts):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.sleep(0.2)
+        spans.append((start, loop.time()))
+        return [await mock.analyze_text(text) for text in texts]
+    
+    mock.analyze_batch = analyze_batch
+    service = BatchingLLMService(mock)
+    
+    try:
+        await asyncio.gather(*(service.analyze_text(f"text {i}") for i in range(10)))
+        assert len(spans) == 2
+        (first_start, first_end), (second_start, second_end) = sorted(spans)
+        assert second_start < first_end
+    finally:
+        await service.close()
+
+
+async def test_batching_llm_service_close():
+    """Test that closing stops the worker and cancels callers whose batch is in flight"""
+    mock = MockLLMService()
+    
+    async def analyze_batch(texts):
+        await asyncio.sleep(10)
+    
+    mock.analyze_batch = analyze_batch
+    service = BatchingLLMService(mock)
+    
+    caller = asyncio.ensure_future(service.analyze_text("Never answered"))
+    await asyncio.sleep(service.MAX_WAIT_MS / 1000 + 0.05)
+    assert service._batches
+    
+    await service.close()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    assert not service._batches
+
+
+async def test_mock_nlp_service(mock_nlp):
     """Test the mock NLP service"""
-    service = MockNLPService()
-    keywords = service.extract_keywords("This is a test article about technology and innovation.")
+    keywords = await mock_nlp.extract_keywords("This is a test article about technology and innovation.")
     assert isinstance(keywords, list)
     assert len(keywords) == 3
 
 
-def test_mock_database_service():
-    """Test the mock database service"""
-    service = MockDatabaseService()
+async def test_nlp_service_memoizes_keywords(monkeypatch):
+    """Test that repeated texts are answered in-process, without another worker call"""
+    calls = []
     
-    async def test_database():
-        await service.init_db()
-        
-        # Test saving analysis
-        analysis_id = await service.save_analysis("Test text", {
-            "summary": "Test summary",
-            "title": "Test title",
-            "topics": ["test", "analysis", "mock"],
-            "sentiment": "neutral",
-            "keywords": ["test", "keyword", "extraction"]
-        })
-        assert analysis_id == 1
-        
-        # Test retrieving analysis
-        analysis = await service.get_analysis(1)
-        assert analysis is not None
-        assert analysis.summary == "Test summary"
-        
-        # Test search
-        from models import SearchRequest
-        search_req = SearchRequest(keyword="test", limit=10)
-        results = await service.search_analyses(search_req)
-        assert len(results) >= 1
+    def extract_keywords(text, num_keywords):
+        calls.append(text)
+        return ("alpha", "beta", "gamma")[:num_keywords]
+    
+    monkeypatch.setattr(nlp_service, "_extract_keywords", extract_keywords)
+    service = NLPService(max_workers=1)
+    # A thread pool runs the patched function; worker processes wouldn't see the patch
+    service.pool.shutdown()
+    service.pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        for _ in range(3):
+            assert await service.extract_keywords("Same text") == ["alpha", "beta", "gamma"]
+        assert await service.extract_keywords("Same text", num_keywords=2) == ["alpha", "beta"]
+        assert calls == ["Same text", "Same text"]
+    finally:
+        service.close()
+
+
+async def test_nlp_service_batch_shares_memo(monkeypatch):
+    """Test that batch extraction reuses and fills the same memo as single extraction"""
+    batches = []
+    
+    def extract_keywords(text, num_keywords):
+        return ("single",) * num_keywords
+    
+    def extract_keywords_batch(texts, num_keywords):
+        batches.append(texts)
+        return [["batch"] * num_keywords for _ in texts]
+    
+    monkeypatch.setattr(nlp_service, "_extract_keywords", extract_keywords)
+    monkeypatch.setattr(nlp_service, "_extract_keywords_batch", extract_keywords_batch)
+    service = NLPService(max_workers=1)
+    service.pool.shutdown()
+    service.pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        assert await service.extract_keywords("Seen before", 2) == ["single", "single"]
+        assert await service.extract_keywords_batch(["Seen before", "New text"], 2) == [
+            ["single", "single"],
+            ["batch", "batch"]
+        ]
+        assert batches == [["New text"]]
         
-        # Test stats
-        stats = await service.get_stats()
-        assert stats["total_analyses"] >= 1
+        assert await service.extract_keywords_batch(["New text", "Seen before"], 2) == [
+            ["batch", "batch"],
+            ["single", "single"]
+        ]
+        assert await service.extract_keywords("New text", 2) == ["batch", "batch"]
+        assert len(batches) == 1
+    finally:
+        service.close()
+
+
+class FakeToken:
+    """Just the token attributes _top_nouns reads, so it can be tested without the spaCy model"""
+    
+    def __init__(self, text, pos):
+        self.text = text
+        self.lower_ = text.lower()
+        self.is_alpha = text.isalpha()
+        self.pos_ = pos
+    
+    def __len__(self):
+        return len(self.text)
+
+
+def test_top_nouns():
+    """Test that the most frequent nouns win, topped up with other frequent words"""
+    doc = [FakeToken(text, pos) for text, pos in [
+        ("Rockets", "NOUN"), ("launch", "VERB"), ("rockets", "NOUN"), ("NASA", "PROPN"),
+        ("said", "VERB"), ("launch", "VERB"), ("a1", "NOUN"), ("go", "VERB")
+    ]]
+    assert nlp_service._top_nouns(doc, 2) == ["rockets", "nasa"]
+    # Stop words, short words, and non-alphabetic tokens are never picked
+    assert nlp_service._top_nouns(doc, 4) == ["rockets", "nasa", "launch"]
+
+
+async def test_mock_database_service(mock_db):
+    """Test the mock database service"""
+    # Test saving analysis; the session database may already hold other rows
+    total_before = (await mock_db.get_stats())["total_analyses"]
+    analysis_id = await mock_db.save_analysis("Test text", CANNED_ANALYSIS)
+    assert analysis_id == total_before + 1
+    
+    # Test retrieving analysis
+    analysis = await mock_db.get_analysis(analysis_id)
+    assert analysis is not None
+    assert analysis.summary == "Test summary"
+    
+    # Test search
+    search_req = SearchRequest(keyword="test", limit=10)
+    results = await mock_db.search_analyses(search_req)
+    assert len(results) >= 1
+    
+    # Words match as prefixes, and a keyword with no words matches nothing
+    assert await mock_db.search_analyses(SearchRequest(keyword="extract", limit=10))
+    assert await mock_db.search_analyses(SearchRequest(keyword="!!", limit=10)) == []
+    
+    # Test stats
+    stats = await mock_db.get_stats()
+    assert stats["total_analyses"] == total_before + 1
+
+
+@pytest.fixture
+async def sqlite_db(tmp_path):
+    """The real database service, on a throwaway SQLite file"""
+    db = DatabaseService(str(tmp_path / "analyses.db"))
+    await db.init_db()
+    yield db
+    await db.close()
+
+
+async def test_database_service_ids(sqlite_db):
+    """Test that concurrent and bulk saves each get the id of their own row"""
+    ids = await asyncio.gather(*(
+        sqlite_db.save_analysis(f"Text {i}", {**CANNED_ANALYSIS, "summary": f"Summary {i}"})
+        for i in range(5)
+    ))
+    ids += await sqlite_db.save_analyses([
+        (f"Text {i}", {**CANNED_ANALYSIS, "summary": f"Summary {i}"})
+        for i in range(5, 8)
+    ])
+    assert ids == list(range(1, 9))
+    for i, analysis_id in enumerate(ids):
+        assert (await sqlite_db.get_analysis(analysis_id)).summary == f"Summary {i}"
+
+
+async def test_database_service_failed_write(sqlite_db):
+    """Test that a bad row in a group commit fails only its own caller"""
+    results = await asyncio.gather(
+        sqlite_db.save_analysis("Valid", CANNED_ANALYSIS),
+        sqlite_db.save_analysis("Invalid", {**CANNED_ANALYSIS, "summary": None}),
+        sqlite_db.save_analysis("Also valid", CANNED_ANALYSIS),
+        return_exceptions=True
+    )
+    assert results[0] == 1
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    assert results[2] == 2
+    
+    # The writer keeps going after a rollback
+    assert await sqlite_db.save_analysis("Valid", CANNED_ANALYSIS) == 3
+    assert (await sqlite_db.get_stats())["total_analyses"] == 3
+
+
+async def test_database_service_writer_stopped(sqlite_db):
+    """Test that saving fails fast instead of hanging once the writer has stopped"""
+    sqlite_db._writer.cancel()
+    await asyncio.wait([sqlite_db._writer])
+    with pytest.raises(RuntimeError):
+        await sqlite_db.save_analysis("Too late", CANNED_ANALYSIS)
+
+
+async def test_database_service_flushes_on_close(tmp_path):
+    """Test that writes still queued at shutdown are committed"""
+    path = str(tmp_path / "analyses.db")
+    db = DatabaseService(path)
+    await db.init_db()
+    pending = asyncio.ensure_future(db.save_analysis("Saved at shutdown", CANNED_ANALYSIS))
+    await asyncio.sleep(0)
+    await db.close()
+    assert await pending == 1
+    
+    db = DatabaseService(path)
+    await db.init_db()
+    try:
+        assert (await db.get_analysis(1)).summary == "Test summary"
+    finally:
+        await db.close()
+
+
+async def test_database_service_search(sqlite_db):
+    """Test full-text search by word prefix, with and without a sentiment filter"""
+    await sqlite_db.save_analyses([
+        ("Advances in technology", {**CANNED_ANALYSIS, "sentiment": "positive"}),
+        ("A report on gardening", CANNED_ANALYSIS)
+    ])
+    
+    results = await sqlite_db.search_analyses(SearchRequest(keyword="tech", limit=10))
+    assert [result.sentiment for result in results] == ["positive"]
+    
+    results = await sqlite_db.search_analyses(SearchRequest(keyword="Test", sentiment="neutral", limit=10))
+    assert [result.sentiment for result in results] == ["neutral"]
+    
+    # FTS5 syntax in a keyword is searched for literally, never parsed
+    for keyword in ['tech" OR "garden', "NEAR(tech garden)", "!!", "*"]:
+        assert await sqlite_db.search_analyses(SearchRequest(keyword=keyword, limit=10)) == []
+
+
+async def test_database_service_stats_cache(sqlite_db):
+    """Test that cached stats are dropped by a save, even one committed mid-computation"""
+    await sqlite_db.save_analysis("First", CANNED_ANALYSIS)
+    
+    # The save lands while get_stats is running
+    stats, _ = await asyncio.gather(
+        sqlite_db.get_stats(),
+        sqlite_db.save_analysis("Second", {**CANNED_ANALYSIS, "sentiment": "positive"})
+    )
+    assert stats["total_analyses"] == sum(stats["sentiment_distribution"].values())
+    assert await sqlite_db.get_stats() == {
+        "total_analyses": 2,
+        "sentiment_distribution": {"neutral": 1, "positive": 1}
+    }
+    
+    await sqlite_db.save_analysis("Third", CANNED_ANALYSIS)
+    assert (await sqlite_db.get_stats())["total_analyses"] == 3
+
+
+def test_fts_query_quoting():
+    """Test that every term is quoted as a prefix, with embedded quotes escaped"""
+    assert DatabaseService._fts_query('say "hi" now') == '"say"* """hi"""* "now"*'
+
+
+async def test_database_service_indexes_existing_rows(tmp_path):
+    """Test that rows saved before the full-text index existed become searchable"""
+    path = str(tmp_path / "analyses.db")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("""
+            CREATE TABLE text_analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                original_text TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                title TEXT,
+                topics TEXT NOT NULL,
+                sentiment TEXT NOT NULL,
+                keywords TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("""
+            INSERT INTO text_analyses (original_text, summary, title, topics, sentiment, keywords)
+            VALUES ('An older article about astronomy', 'Old summary', NULL, '[]', 'neutral', '[]')
+        """)
+    conn.close()
+    
+    db = DatabaseService(path)
+    await db.init_db()
+    try:
+        results = await db.search_analyses(SearchRequest(keyword="astronomy", limit=10))
+        assert [result.summary for result in results] == ["Old summary"]
+    finally:
+        await db.close()
+
+
+async def test_identical_requests_coalesced(app_module, monkeypatch):
+    """Test that identical concurrent analyses share one pipeline run"""
+    calls = []
+    
+    class SlowLLMService(MockLLMService):
+        async def analyze_text(self, text):
+            calls.append(text)
+            await asyncio.sleep(0.01)
+            return await super().analyze_text(text)
+    
+    monkeypatch.setattr(app_module, "llm_service", SlowLLMService())
+    request = TextAnalysisRequest(text="A text submitted by several clients at once.")
+    results = await asyncio.gather(*(app_module.analyze_text(request) for _ in range(3)))
+    assert len({result.summary for result in results}) == 1
+    assert len(calls) == 1
+    assert not app_module.inflight
+
+
+async def test_cache_service():
+    """Test cache hits, misses, and LRU eviction"""
+    service = CacheService(max_entries=2)
+    
+    key = service.make_key("  Some Text ")
+    assert key == service.make_key("some text")
+    assert await service.get(key) is None
+    
+    await service.set(key, {"summary": "cached"})
+    assert (await service.get(key))["summary"] == "cached"
+    
+    await service.set("b", {})
+    await service.set("c", {})
+    assert await service.get(key) is None
     
-    asyncio.run(test_database())
+    stats = service.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
 
 
 if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
+    pytest.main([__file__, "-q", "--no-header"])